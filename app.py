@@ -1,8 +1,26 @@
 # app.py
+# Make blocking socket I/O (requests, psycopg2) cooperative under gevent workers.
+# This must run before anything else imports socket/ssl.
+from gevent import monkey
+monkey.patch_all()
+from psycogreen.gevent import patch_psycopg
+patch_psycopg()
+
 import os
+import datetime
+import queue
+import threading
+from collections import OrderedDict
+from time import monotonic
 import requests
 import psycopg2
-from flask import Flask, render_template, request, redirect, url_for, jsonify
+import psycopg2.extensions
+import psycopg2.pool
+import orjson
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from flask.json.provider import DefaultJSONProvider, JSONProvider
+from flask import Flask, render_template, request, redirect, url_for, jsonify, make_response, Response, stream_template
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -10,15 +28,51 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # --- CONFIGURATION ---
+
+class ORJSONProvider(JSONProvider):
+    """Serializes jsonify() responses and the tojson filter with orjson."""
+
+    # Types orjson can't handle natively (Decimal, __html__ objects, ...) fall back to Flask's rules
+    default = staticmethod(DefaultJSONProvider.default)
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NAIVE_UTC
+        if kwargs.get('sort_keys'):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=kwargs.get('default', self.default), option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 # Load credentials from .env
 AIO_USERNAME = os.getenv("AIO_USERNAME")
 AIO_KEY = os.getenv("AIO_KEY")
 NEON_DATABASE_URL = os.getenv("NEON_DATABASE_URL")
 
+# Connection parameters already present in NEON_DATABASE_URL (empty if unset or malformed)
+try:
+    NEON_DSN_PARAMS = psycopg2.extensions.parse_dsn(NEON_DATABASE_URL or "")
+except psycopg2.ProgrammingError:
+    NEON_DSN_PARAMS = {}
+# Neon's "-pooler" hosts are PgBouncer in transaction mode, which can't keep session-level PREPAREd statements
+NEON_USES_POOLER = "-pooler" in NEON_DSN_PARAMS.get("host", "")
+
 # Base URL for Adafruit IO API
 AIO_HEADERS = {"X-AIO-Key": AIO_KEY}
 
+# Shared HTTP session so Adafruit IO calls reuse keep-alive TLS connections
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=10,
+    max_retries=Retry(total=2, backoff_factor=0.2),
+))
+SESSION.headers.update(AIO_HEADERS)
+
 # Feeds used by the application 
 FEEDS = {
     "temperature": "home/temperature",
@@ -31,145 +85,343 @@ FEEDS = {
     "last_image": "home/last_image_ts" 
 }
 
+# Device names accepted by /api/control and the actuator feeds they drive
+FEED_KEY_MAP = {
+    'light': 'ctrl_light',
+    'lcd_text': 'ctrl_lcd_text',
+    'mode': 'ctrl_mode',
+}
+
+# Success message shown for each device once its command has been sent
+SUCCESS_FMT = {
+    'lcd_text': "Lcd text set to '{v}'",
+    'mode': "Mode set to {v}",
+    'light': "Light set to {v}",
+}
+
+# Longest message the LCD screen can display
+MAX_LCD_LEN = 32
+
+# Pending (feed_key, value) control commands, sent to Adafruit IO by a background worker
+CONTROL_QUEUE = queue.Queue(maxsize=1024)
+
+# Adafruit IO group holding the live sensor feeds (one GET returns every feed's last value)
+LIVE_FEED_GROUP = "home"
+
+# Adafruit IO URLs and lookups, built once at import
+_AIO_BASE = f"https://io.adafruit.com/api/v2/{AIO_USERNAME}"
+FEED_URL_POST = {feed_key: f"{_AIO_BASE}/feeds/{feed_name}/data" for feed_key, feed_name in FEEDS.items()}
+LIVE_GROUP_URL = f"{_AIO_BASE}/groups/{LIVE_FEED_GROUP}"
+# Feeds inside a group are keyed as "group.feed" in the group payload
+LIVE_FEED_KEYS = {FEEDS[k].replace('/', '.'): k for k in ["temperature", "humidity", "motion"]}
+
+# Live readings are reused for this many seconds so dashboard refresh bursts share one upstream fetch
+LIVE_DATA_TTL = 2
+_live_data_cache = {"value": None, "expires": 0.0, "refreshing": False}
+_live_data_lock = threading.Lock()
+
+# Pooled Neon connections, created on first use so the app can start without the DB.
+# psycopg2's pool closes any returned connection beyond NEON_POOL_MIN, so MIN == MAX keeps them all warm.
+NEON_POOL_MAX = 10
+NEON_POOL_MIN = NEON_POOL_MAX
+# libpq options for pooled connections: TCP keepalives stop idle connections from being
+# silently dropped between requests, and statement_timeout (ms) bounds any single query
+NEON_CONNECT_OPTIONS = {
+    'sslmode': 'require',
+    'keepalives': 1,
+    'keepalives_idle': 30,
+    'keepalives_interval': 10,
+    'tcp_user_timeout': 15000,
+    # Appended to any options already in the URL (e.g. Neon's endpoint=...), which would otherwise be replaced
+    'options': " ".join(filter(None, [NEON_DSN_PARAMS.get('options'), '-c statement_timeout=5000'])),
+}
+_neon_pool = None
+_neon_pool_lock = threading.Lock()
+# getconn() raises instead of waiting when all NEON_POOL_MAX connections are out, so requests
+# queue on this semaphore (cooperative under gevent) for up to NEON_POOL_WAIT seconds first
+NEON_POOL_WAIT = 10
+_neon_pool_slots = threading.BoundedSemaphore(NEON_POOL_MAX)
+
+# Past days never change, so their query results are kept in a small per-process LRU
+PAST_DAY_CACHE_SIZE = 256
+_past_day_cache = OrderedDict()
+_past_day_cache_lock = threading.Lock()
+
+# The About page only changes between deploys: render it once and let browsers cache it
+ABOUT_MAX_AGE = 3600
+_about_html = None
+
 # Database sensor and column mapping (Must match the table created on Neon)
 DB_SENSOR_MAP = {
     'temperature': 'temp_c',
     'humidity': 'humidity_pct',
 }
 
+# Queries PREPAREd once per pooled connection, so later calls only send parameters;
+# {start}/{end} become $1/$2 for PREPARE, or %s for plain execution behind the pooler.
+# (range predicate on ts_iso so the indexes in neon_indexes.sql can be used;
+# the history query returns the day's labels and values as JSON array text)
+HISTORY_QUERY = """
+SELECT
+    COALESCE(json_agg(TO_CHAR(ts_iso, 'HH24:MI') ORDER BY ts_iso)::text, '[]'),
+    COALESCE(json_agg({db_column}::float8 ORDER BY ts_iso)::text, '[]')
+FROM sensor_data 
+WHERE ts_iso >= {start} AND ts_iso < {end}
+"""
+INTRUSION_LOGS_QUERY = """
+SELECT TO_CHAR(ts_iso, 'YYYY-MM-DD HH24:MI:SS') AS timestamp, image_path
+FROM sensor_data 
+WHERE ts_iso >= {start} AND ts_iso < {end} 
+  AND (motion = TRUE OR motion = 1) AND image_path IS NOT NULL 
+ORDER BY ts_iso DESC
+"""
+_STATEMENT_TEMPLATES = {
+    f"hist_{db_column}": HISTORY_QUERY.replace("{db_column}", db_column)
+    for db_column in DB_SENSOR_MAP.values()
+}
+_STATEMENT_TEMPLATES["intrusion_logs"] = INTRUSION_LOGS_QUERY
+PREPARED_STATEMENTS = {name: sql.format(start="$1", end="$2") for name, sql in _STATEMENT_TEMPLATES.items()}
+PLAIN_STATEMENTS = {name: sql.format(start="%s", end="%s") for name, sql in _STATEMENT_TEMPLATES.items()}
+
+# Chart.js payload served by /api/history; the arrays from HISTORY_QUERY are spliced in as-is
+CHART_JSON_TEMPLATE = (
+    '{{"labels":{labels},"datasets":[{{"label":{label},"data":{values},'
+    '"borderColor":"#3498db","tension":0.3}}]}}'
+)
+
 # --- HELPER FUNCTIONS: Adafruit IO Interactions ---
 
 def fetch_live_data():
+    """Returns the latest live readings, refreshing from Adafruit IO at most once per LIVE_DATA_TTL seconds.
+    
+    Only one request refreshes at a time; others keep getting the previous readings until it finishes.
+    The lock is never held across the upstream call, and failed fetches are not cached.
+    """
+    with _live_data_lock:
+        cached = _live_data_cache["value"]
+        if monotonic() < _live_data_cache["expires"]:
+            return cached
+        if _live_data_cache["refreshing"] and cached is not None:
+            return cached
+        _live_data_cache["refreshing"] = True
+    
+    try:
+        data = _fetch_live_data_uncached()
+    finally:
+        with _live_data_lock:
+            _live_data_cache["refreshing"] = False
+    
+    if set(data.values()) != {'Error'}:
+        with _live_data_lock:
+            _live_data_cache["value"] = data
+            _live_data_cache["expires"] = monotonic() + LIVE_DATA_TTL
+    return data
+
+def _fetch_live_data_uncached():
     """Fetches the latest value for Temperature, Humidity, and Motion from Adafruit IO via HTTP."""
-    data = {}
-    for feed_key in ["temperature", "humidity", "motion"]:
-        feed_name = FEEDS.get(feed_key)
-        if not feed_name: continue
-        
-        url = f"https://io.adafruit.com/api/v2/{AIO_USERNAME}/feeds/{feed_name}/data/last"
-        
-        try:
-            response = requests.get(url, headers=AIO_HEADERS, timeout=5)
-            response.raise_for_status()
-            data[feed_key] = response.json().get('value', 'N/A')
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching live data for {feed_key}: {e}")
-            data[feed_key] = 'Error'
+    try:
+        response = SESSION.get(LIVE_GROUP_URL, timeout=5)
+        response.raise_for_status()
+        feeds = response.json().get('feeds', [])
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching live data for group {LIVE_FEED_GROUP}: {e}")
+        return {feed_key: 'Error' for feed_key in LIVE_FEED_KEYS.values()}
+    
+    data = {feed_key: 'N/A' for feed_key in LIVE_FEED_KEYS.values()}
+    for feed in feeds:
+        feed_key = LIVE_FEED_KEYS.get(feed.get('key'))
+        if feed_key and feed.get('last_value') is not None:
+            data[feed_key] = feed['last_value']
     return data
 
 def send_control_command(feed_key, value):
     """Sends a control command to an actuator feed on Adafruit IO via HTTP POST."""
-    feed_name = FEEDS.get(feed_key)
-    if not feed_name:
+    url = FEED_URL_POST.get(feed_key)
+    if not url:
         return False, "Invalid feed key"
 
-    url = f"https://io.adafruit.com/api/v2/{AIO_USERNAME}/feeds/{feed_name}/data"
     payload = {"value": value}
     
     try:
-        response = requests.post(url, headers=AIO_HEADERS, json=payload, timeout=5)
+        response = SESSION.post(url, json=payload, timeout=5)
         response.raise_for_status()
         return True, "Success"
     except requests.exceptions.RequestException as e:
         print(f"Error sending control command to {feed_key}: {e}")
         return False, f"Error: {e}"
 
+def _drain_control_queue():
+    """Background worker: sends queued control commands to Adafruit IO one at a time."""
+    while True:
+        feed_key, value = CONTROL_QUEUE.get()
+        try:
+            send_control_command(feed_key, value)
+        except Exception as e:
+            print(f"Error sending queued control command to {feed_key}: {e}")
+        finally:
+            CONTROL_QUEUE.task_done()
+
+threading.Thread(target=_drain_control_queue, daemon=True).start()
+
 # --- HELPER FUNCTIONS: NEON Database Interactions ---
 
+class NeonConnection(psycopg2.extensions.connection):
+    """psycopg2 connection that remembers which PREPARED_STATEMENTS exist on its session."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+def _get_neon_pool():
+    """Returns the shared Neon connection pool, creating it on first use."""
+    global _neon_pool
+    with _neon_pool_lock:
+        if _neon_pool is None:
+            _neon_pool = psycopg2.pool.ThreadedConnectionPool(
+                NEON_POOL_MIN, NEON_POOL_MAX, dsn=NEON_DATABASE_URL,
+                connection_factory=NeonConnection, **NEON_CONNECT_OPTIONS
+            )
+        return _neon_pool
+
 def connect_to_neon():
-    """Establishes a connection to the Neon PostgreSQL database."""
+    """Borrows a connection to the Neon PostgreSQL database from the pool, waiting for a free slot."""
+    if not _neon_pool_slots.acquire(timeout=NEON_POOL_WAIT):
+        print("DATABASE CONNECTION ERROR: timed out waiting for a pooled connection")
+        return None
     try:
-        return psycopg2.connect(NEON_DATABASE_URL)
+        return _get_neon_pool().getconn()
     except psycopg2.Error as e:
+        _neon_pool_slots.release()
         print(f"DATABASE CONNECTION ERROR: {e}")
         return None
 
-def fetch_historical_data(date, sensor):
-    """Fetches historical sensor data for a specific date from NEON (Cloud DB)."""
-    conn = connect_to_neon()
-    if not conn:
-        return None, "Failed to connect to the cloud database."
+def release_neon_connection(conn, discard=False):
+    """Returns a borrowed connection to the pool, discarding it if asked to or if the server closed it."""
+    try:
+        _get_neon_pool().putconn(conn, close=discard or bool(conn.closed))
+    finally:
+        _neon_pool_slots.release()
+
+def _is_dead_connection_error(e):
+    """True for errors raised because the connection itself is gone (not for statement timeouts)."""
+    return (isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
+            and not isinstance(e, psycopg2.extensions.QueryCanceledError))
+
+def query_neon(work):
+    """Runs work(cursor) on a pooled Neon connection and returns (result, error).
+    
+    Neon closes idle connections when its compute suspends, so if the borrowed connection turns out
+    to be dead it is dropped from the pool and the query is retried once on a fresh one.
+    """
+    for attempt in range(2):
+        conn = connect_to_neon()
+        if not conn:
+            return None, "Failed to connect to the cloud database."
         
-    data = None
-    error = None
+        dead = False
+        try:
+            with conn.cursor() as cursor:
+                return work(cursor), None
+        except psycopg2.Error as e:
+            dead = _is_dead_connection_error(e)
+            if dead and not attempt:
+                print(f"Dropping dead database connection and retrying: {e}")
+                continue
+            print(f"Database query error: {e}")
+            return None, f"Database Query Error: {e}"
+        finally:
+            release_neon_connection(conn, discard=dead)
+
+def execute_prepared(cursor, name, params):
+    """Executes one of PREPARED_STATEMENTS, preparing it on the cursor's connection on first use.
+    
+    Behind Neon's pooler (NEON_USES_POOLER) each transaction may run on a different backend,
+    so the equivalent PLAIN_STATEMENTS query is sent with its parameters instead.
+    """
+    if NEON_USES_POOLER:
+        cursor.execute(PLAIN_STATEMENTS[name], params)
+        return
     
+    conn = cursor.connection
+    if name not in conn.prepared:
+        cursor.execute(f"PREPARE {name} AS {PREPARED_STATEMENTS[name]}")
+        conn.prepared.add(name)
+    placeholders = ", ".join(["%s"] * len(params))
+    cursor.execute(f"EXECUTE {name} ({placeholders})", params)
+
+def parse_date(value):
+    """Parses a YYYY-MM-DD form/URL value into a datetime.date, or None if it is missing or malformed."""
     try:
-        cursor = conn.cursor()
-        
-        if sensor not in DB_SENSOR_MAP:
-             error = "Invalid sensor requested."
-             return None, error
-        
-        db_column = DB_SENSOR_MAP[sensor]
-        
-        # SQL query to retrieve data for the selected date
-        query = f"""
-        SELECT ts_iso, {db_column} 
-        FROM sensor_data 
-        WHERE DATE(ts_iso) = %s 
-        ORDER BY ts_iso;
-        """
-        
-        cursor.execute(query, (date,))
-        results = cursor.fetchall()
-        
-        # Prepare data for Chart.js
-        labels = [row[0].strftime('%H:%M') for row in results] 
-        values = [float(row[1]) for row in results] 
-        
-        data = {
-            "labels": labels,
-            "datasets": [{
-                "label": sensor.capitalize(),
-                "data": values,
-                "borderColor": "#3498db",
-                "tension": 0.3 
-            }]
-        }
-        
-    except psycopg2.Error as e:
-        print(f"Database query error: {e}")
-        error = f"Database Query Error: {e}"
-    finally:
-        conn.close()
-            
-    return data, error
+        return datetime.date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+def day_bounds(date):
+    """Returns the [start, end) datetime.date pair covering a single day, for ts_iso range filters."""
+    return date, date + datetime.timedelta(days=1)
+
+def _cached_past_day(key, day, fetch):
+    """Returns fetch()'s (result, error) pair, serving past days from the LRU. Errors are never cached."""
+    if day >= datetime.date.today():
+        return fetch()
+    
+    with _past_day_cache_lock:
+        if key in _past_day_cache:
+            _past_day_cache.move_to_end(key)
+            return _past_day_cache[key]
+    
+    result = fetch()
+    if result[1] is None:
+        with _past_day_cache_lock:
+            _past_day_cache[key] = result
+            _past_day_cache.move_to_end(key)
+            if len(_past_day_cache) > PAST_DAY_CACHE_SIZE:
+                _past_day_cache.popitem(last=False)
+    return result
+
+def fetch_historical_data(date, sensor):
+    """Fetches historical sensor data for a specific datetime.date as Chart.js JSON text, caching days that are already over."""
+    return _cached_past_day(('history', date, sensor), date, lambda: _query_historical_data(date, sensor))
 
 def fetch_intrusion_logs(date):
+    """Fetches intrusion logs for a specific datetime.date, caching days that are already over."""
+    return _cached_past_day(('intrusions', date), date, lambda: _query_intrusion_logs(date))
+
+def _query_historical_data(date, sensor):
+    """Fetches historical sensor data for a specific date from NEON (Cloud DB) as Chart.js JSON text."""
+    if sensor not in DB_SENSOR_MAP:
+        return None, "Invalid sensor requested."
+    
+    db_column = DB_SENSOR_MAP[sensor]
+    
+    def work(cursor):
+        execute_prepared(cursor, f"hist_{db_column}", day_bounds(date))
+        return cursor.fetchone()
+    
+    row, error = query_neon(work)
+    if error:
+        return None, error
+    
+    # Prepare data for Chart.js (the text columns are never decoded in Python)
+    labels, values = row
+    data = CHART_JSON_TEMPLATE.format(
+        labels=labels,
+        label=orjson.dumps(sensor.capitalize()).decode(),
+        values=values,
+    )
+    return data, None
+
+def _query_intrusion_logs(date):
     """Fetches records where motion was detected for a specific date from NEON (Cloud DB)."""
-    conn = connect_to_neon()
-    if not conn:
-        return [], "Failed to connect to the cloud database."
-        
-    logs = []
-    error = None
+    def work(cursor):
+        execute_prepared(cursor, "intrusion_logs", day_bounds(date))
+        return [
+            {'timestamp': ts, 'image_path': path or "No image recorded"}
+            for ts, path in cursor
+        ]
     
-    try:
-        cursor = conn.cursor()
-        
-        query = """
-        SELECT ts_iso, image_path
-        FROM sensor_data 
-        WHERE DATE(ts_iso) = %s AND (motion = TRUE OR motion = 1) AND image_path IS NOT NULL 
-        ORDER BY ts_iso DESC;
-        """
-        
-        cursor.execute(query, (date,))
-        results = cursor.fetchall()
-        
-        for ts, path in results:
-             logs.append({
-                 'timestamp': ts.strftime('%Y-%m-%d %H:%M:%S'),
-                 'image_path': path or "No image recorded" 
-             })
-        
-    except psycopg2.Error as e:
-        print(f"Database query error: {e}")
-        error = f"Database Query Error: {e}"
-    finally:
-        conn.close()
-            
-    return logs, error 
+    logs, error = query_neon(work)
+    return logs or [], error 
 
 
 # --- ROUTES: The 5 Required Pages ---
@@ -178,17 +430,27 @@ def fetch_intrusion_logs(date):
 def home():
     """Route 1: Home page/Main Dashboard. Shows live data."""
     live_data = fetch_live_data()
-    return render_template('home.html', live_data=live_data)
+    response = make_response(render_template('home.html', live_data=live_data))
+    response.cache_control.max_age = LIVE_DATA_TTL
+    return response
 
 @app.route('/about')
 def about():
-    """Route 2: About page."""
-    return render_template('about.html')
+    """Route 2: About page. Rendered once per process and served with cache headers + ETag."""
+    global _about_html
+    if _about_html is None:
+        _about_html = render_template('about.html')
+    
+    response = Response(_about_html, mimetype='text/html')
+    response.cache_control.public = True
+    response.cache_control.max_age = ABOUT_MAX_AGE
+    response.cache_control.immutable = True
+    response.add_etag()
+    return response.make_conditional(request)
 
 @app.route('/environmental', methods=['GET', 'POST'])
 def environmental_data():
-    """Route 3: Environmental Data page. Handles historical data selection and plotting."""
-    chart_data_json = None
+    """Route 3: Environmental Data page. Handles historical data selection; the chart is loaded from /api/history."""
     error = None
     selected_date = None
     selected_sensor = None
@@ -197,14 +459,10 @@ def environmental_data():
         selected_date = request.form.get('date')
         selected_sensor = request.form.get('sensor')
         
-        if selected_date and selected_sensor:
-            chart_data, error = fetch_historical_data(selected_date, selected_sensor)
-            
-            if chart_data:
-                chart_data_json = jsonify(chart_data).get_data(as_text=True)
+        if selected_date and not parse_date(selected_date):
+            error = "Invalid date. Please use the YYYY-MM-DD format."
             
     return render_template('environmental.html', 
-                           chart_data=chart_data_json, 
                            error=error,
                            selected_date=selected_date,
                            selected_sensor=selected_sensor)
@@ -229,19 +487,24 @@ def manage_security():
             status_msg = f"Security System: {'DISARMED' if success else 'Failed to Disarm'}. Message: {msg}"
         elif action == 'get_logs':
             selected_log_date = request.form.get('log_date')
-            if selected_log_date:
-                intrusion_logs, log_error = fetch_intrusion_logs(selected_log_date)
+            log_date = parse_date(selected_log_date)
+            if log_date:
+                intrusion_logs, log_error = fetch_intrusion_logs(log_date)
+            elif selected_log_date:
+                 log_error = "Invalid date. Please use the YYYY-MM-DD format."
             else:
                  log_error = "Please select a date to fetch logs."
     
     if intrusion_logs is None:
         intrusion_logs = []
 
-    return render_template('manage_security.html', 
-                           status_msg=status_msg, 
-                           intrusion_logs=intrusion_logs,
-                           log_error=log_error,
-                           selected_log_date=selected_log_date)
+    # Stream the page so the first bytes go out before every log row is rendered
+    return Response(stream_template('manage_security.html', 
+                                    status_msg=status_msg, 
+                                    intrusion_logs=intrusion_logs,
+                                    log_error=log_error,
+                                    selected_log_date=selected_log_date),
+                    mimetype='text/html')
 
 
 @app.route('/device-control')
@@ -249,28 +512,39 @@ def device_control():
     """Route 5: Device Control page. Allows controlling 3+ devices."""
     return render_template('device_control.html')
 
+# --- API ENDPOINT for Historical Data (Called by JS in environmental.html) ---
+
+@app.route('/api/history/<sensor>/<date>')
+def history_api(sensor, date):
+    """API: Returns Chart.js-ready historical data for the specified sensor and date."""
+    if sensor not in DB_SENSOR_MAP:
+        return jsonify({"success": False, "message": "Invalid sensor requested."}), 400
+    
+    day = parse_date(date)
+    if not day:
+        return jsonify({"success": False, "message": "Invalid date. Please use the YYYY-MM-DD format."}), 400
+    
+    chart_data, error = fetch_historical_data(day, sensor)
+    
+    if error:
+        return jsonify({"success": False, "message": error}), 500
+    
+    return Response(chart_data, mimetype='application/json')
+
 # --- API ENDPOINT for Device Control (Called by JS in device_control.html) ---
 
 @app.route('/api/control/<device>/<value>', methods=['POST'])
 def control_device_api(device, value):
-    """API: Sends command to the specified device/state/value via Adafruit IO."""
-    
-    feed_key_map = {
-        'light': 'ctrl_light',
-        'lcd_text': 'ctrl_lcd_text', # New feed map
-        'mode': 'ctrl_mode', 
-    }
-    
-    feed_key = feed_key_map.get(device)
+    """API: Sends command to the specified device/state/value via Adafruit IO (queued with a 202 unless ?sync=1)."""
+    feed_key = FEED_KEY_MAP.get(device)
     
     if not feed_key:
         return jsonify({"success": False, "message": "Invalid device"}), 400
 
     # Handle LCD Text input validation
     if device == 'lcd_text':
-        MAX_LENGTH = 32
-        if len(value) > MAX_LENGTH:
-             return jsonify({"success": False, "message": f"Text must be {MAX_LENGTH} characters or less."}), 400
+        if len(value) > MAX_LCD_LEN:
+             return jsonify({"success": False, "message": f"Text must be {MAX_LCD_LEN} characters or less."}), 400
         # For LCD, the value is the text itself
         control_value = value
         
@@ -280,14 +554,21 @@ def control_device_api(device, value):
     else: # Light (ON/OFF)
         control_value = value.upper()
 
+    if request.args.get('sync') != '1':
+        try:
+            CONTROL_QUEUE.put_nowait((feed_key, control_value))
+        except queue.Full:
+            return jsonify({"success": False, "message": "Too many pending commands, please try again."}), 503
+        return jsonify({"success": True, "queued": True, "message": f"{SUCCESS_FMT[device].format(v=control_value)} (queued)"}), 202
+
     success, msg = send_control_command(feed_key, control_value)
     
     if success:
-        return jsonify({"success": True, "message": f"{device.replace('_', ' ').capitalize()} set to '{control_value}'" if device == 'lcd_text' else f"{device.capitalize()} set to {control_value}"})
+        return jsonify({"success": True, "message": SUCCESS_FMT[device].format(v=control_value)})
     else:
         return jsonify({"success": False, "message": f"Failed to control {device}: {msg}"}), 500
 
 # --- MAIN RUN BLOCK ---
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0')
\ No newline at end of file
+    app.run(debug=True, host='0.0.0.0')
\ No newline at end of file
@@ -0,0 +1,8 @@
+# gunicorn.conf.py
+# Production server settings (picked up automatically by `gunicorn app:app`).
+# The app is almost entirely I/O-bound (Adafruit IO + Neon), so gevent workers
+# let each process keep many requests in flight while they wait on the network.
+
+worker_class = "gevent"
+workers = 2
+worker_connections = 500
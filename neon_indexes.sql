@@ -0,0 +1,11 @@
+-- neon_indexes.sql
+-- Indexes backing the date-range queries in app.py. Run once against the Neon database.
+
+-- Historical chart data: ts_iso >= day AND ts_iso < day + 1
+CREATE INDEX IF NOT EXISTS sensor_data_ts_iso_idx
+    ON sensor_data (ts_iso);
+
+-- Intrusion logs: only motion events with a captured image
+CREATE INDEX IF NOT EXISTS sensor_data_intrusions_ts_iso_idx
+    ON sensor_data (ts_iso)
+    WHERE (motion = TRUE OR motion = 1) AND image_path IS NOT NULL;